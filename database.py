@@ -3,33 +3,141 @@ Database layer - Pure CRUD operations only.
 No business logic or interpretation of data.
 """
 import os
+import queue
 import sqlite3
+import threading
 from contextlib import contextmanager
+from datetime import date, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, List, Optional, Sequence
 
 DATABASE_PATH = Path(os.environ.get("DATABASE_PATH", "careplan.db"))
+POOL_SIZE = int(os.environ.get("DATABASE_POOL_SIZE", "8"))
+
+# sqlite3 keeps prepared statements per connection, keyed by SQL text.
+# Queries below are module constants so every call reuses the same text.
+STATEMENT_CACHE_SIZE = 256
+
+# Per-connection tuning. journal_mode=WAL persists in the database file,
+# so it is set once in init_db() rather than on every connect.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+# Bump when the DDL in init_db() changes
+SCHEMA_VERSION = 3
+
+INDEX_STATEMENTS = (
+    # Superseded indexes
+    "DROP INDEX IF EXISTS idx_careplans_name_lower",
+    "DROP INDEX IF EXISTS idx_careplans_order",
+    "DROP INDEX IF EXISTS idx_providers_name_lower",
+    "DROP INDEX IF EXISTS idx_careplans_mrn_med_dx",
+    "DROP INDEX IF EXISTS idx_careplans_mrn_med_dx_created",
+    """CREATE INDEX IF NOT EXISTS idx_careplans_name
+       ON care_plans(patient_first_name COLLATE NOCASE, patient_last_name COLLATE NOCASE)""",
+    # created_at right after (mrn, medication) lets the same-day and
+    # previous-day checks seek straight to their date range; trailing
+    # primary_diagnosis keeps the order lookup covering
+    """CREATE INDEX IF NOT EXISTS idx_careplans_mrn_med_created_dx
+       ON care_plans(patient_mrn, medication_name COLLATE NOCASE,
+                     created_at, primary_diagnosis COLLATE NOCASE)""",
+    "DROP INDEX IF EXISTS idx_providers_name",
+    # npi included so the name lookup never touches the table
+    "CREATE INDEX IF NOT EXISTS idx_providers_name_npi ON providers(name COLLATE NOCASE, npi)",
+)
+
+_pool: Optional[queue.LifoQueue] = None
+_pool_lock = threading.Lock()
 
 
 def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
+    # Pooled connections move between worker threads, but a connection is
+    # only ever checked out by one caller at a time.
+    # Autocommit (isolation_level=None): single statements commit on their
+    # own, and multi-statement writes open an explicit BEGIN IMMEDIATE.
+    # uri=True also accepts "file:" URIs, e.g. a shared in-memory database.
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        isolation_level=None,
+        uri=True,
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+def _get_pool() -> queue.LifoQueue:
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = queue.LifoQueue(maxsize=POOL_SIZE)
+                for _ in range(POOL_SIZE):
+                    pool.put(get_connection())
+                _pool = pool
+    return _pool
+
+
+def close_pool():
+    """
+    Close all pooled connections.
+    The pool is recreated on next use.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
 @contextmanager
 def get_db():
-    conn = get_connection()
+    pool = _get_pool()
+    conn = pool.get()
     try:
         yield conn
+        # Ends an explicit transaction; a no-op after autocommitted statements
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        pool.put(conn)
 
 
 def init_db():
-    """Initialize database tables."""
+    """
+    Initialize database tables and indexes.
+    A no-op when PRAGMA user_version is already SCHEMA_VERSION or newer, so
+    only the first worker to start against a database runs the DDL, and an
+    older worker (e.g. mid rolling deploy) never downgrades a newer schema.
+    """
     with get_db() as conn:
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            return
+        
+        # journal_mode cannot change inside a transaction
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        # Another worker may have migrated while we waited for the lock
+        if _schema_version(conn) >= SCHEMA_VERSION:
+            return
+        
         cursor = conn.cursor()
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS care_plans (
@@ -57,150 +165,352 @@ def init_db():
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        
+        # Indexes backing the duplicate-check and provider lookups. Their
+        # NOCASE columns match the "col = ? COLLATE NOCASE" predicates;
+        # idx_careplans_mrn_med_created_dx also serves MRN-only lookups via its prefix.
+        for statement in INDEX_STATEMENTS:
+            cursor.execute(statement)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def optimize_db():
+    """Let SQLite refresh query planner statistics where it deems useful."""
+    with get_db() as conn:
+        conn.execute("PRAGMA optimize")
 
 
 # --- Care Plan queries ---
 
+# Lookups only need to identify a match, so they skip the large
+# patient_records / generated_plan columns. SELECT * is kept for export.
+CARE_PLAN_MATCH_COLUMNS = "id, patient_mrn, medication_name, primary_diagnosis"
+
+SQL_FIND_CARE_PLAN_BY_MRN = f"SELECT {CARE_PLAN_MATCH_COLUMNS} FROM care_plans WHERE patient_mrn = ?"
+
+SQL_FIND_CARE_PLAN_BY_PATIENT_NAME = f"""
+    SELECT {CARE_PLAN_MATCH_COLUMNS} FROM care_plans
+    WHERE patient_first_name = ? COLLATE NOCASE
+    AND patient_last_name = ? COLLATE NOCASE
+"""
+
+SQL_FIND_CARE_PLAN_BY_ORDER = f"""
+    SELECT {CARE_PLAN_MATCH_COLUMNS} FROM care_plans
+    WHERE patient_mrn = ?
+    AND medication_name = ? COLLATE NOCASE
+    AND primary_diagnosis = ? COLLATE NOCASE
+"""
+
+# Day checks compare created_at ("YYYY-MM-DD HH:MM:SS", UTC) against date
+# bounds bound as parameters (see _day_bounds) rather than wrapping it in
+# DATE(), so the index can seek the range
+SQL_FIND_DUPLICATE_SUBMISSION = f"""
+    SELECT {CARE_PLAN_MATCH_COLUMNS} FROM care_plans
+    WHERE patient_first_name = ? COLLATE NOCASE
+    AND patient_last_name = ? COLLATE NOCASE
+    AND patient_mrn = ?
+    AND medication_name = ? COLLATE NOCASE
+    AND created_at >= ? AND created_at < ?
+"""
+
+SQL_FIND_PREVIOUS_SUBMISSION = f"""
+    SELECT {CARE_PLAN_MATCH_COLUMNS} FROM care_plans
+    WHERE patient_mrn = ?
+    AND medication_name = ? COLLATE NOCASE
+    AND created_at < ?
+"""
+
+SQL_INSERT_CARE_PLAN = """
+    INSERT INTO care_plans
+    (patient_first_name, patient_last_name, referring_provider,
+     referring_provider_npi, patient_mrn, primary_diagnosis,
+     medication_name, additional_diagnoses, medication_history,
+     patient_records, generated_plan)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+CARE_PLAN_COLUMNS = (
+    "id", "patient_first_name", "patient_last_name", "referring_provider",
+    "referring_provider_npi", "patient_mrn", "primary_diagnosis",
+    "medication_name", "additional_diagnoses", "medication_history",
+    "patient_records", "generated_plan", "created_at",
+)
+
+
+def _day_bounds(today: date) -> tuple:
+    """ISO start of today and of tomorrow, for the created_at range checks."""
+    return today.isoformat(), (today + timedelta(days=1)).isoformat()
+
+
+def _fetch_row(conn: sqlite3.Connection, sql: str, params: tuple) -> Optional[dict]:
+    """Run a single-row query on an open connection and return it as a dict."""
+    row = conn.execute(sql, params).fetchone()
+    return dict(row) if row else None
+
+
+def _fetch_one(sql: str, params: tuple) -> Optional[dict]:
+    """Run a single-row query on a pooled connection."""
+    with get_db() as conn:
+        return _fetch_row(conn, sql, params)
+
+
 def find_care_plan_by_mrn(mrn: str) -> Optional[dict]:
     """Find a care plan by patient MRN."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM care_plans WHERE patient_mrn = ?", (mrn,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    return _fetch_one(SQL_FIND_CARE_PLAN_BY_MRN, (mrn,))
 
 
 def find_care_plan_by_patient_name(first_name: str, last_name: str) -> Optional[dict]:
     """Find a care plan by patient name (case-insensitive)."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT * FROM care_plans 
-               WHERE LOWER(patient_first_name) = LOWER(?) 
-               AND LOWER(patient_last_name) = LOWER(?)""",
-            (first_name, last_name)
-        )
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    return _fetch_one(SQL_FIND_CARE_PLAN_BY_PATIENT_NAME, (first_name, last_name))
 
 
 def find_care_plan_by_order(mrn: str, medication_name: str, primary_diagnosis: str) -> Optional[dict]:
     """Find a care plan matching the exact order criteria."""
+    return _fetch_one(SQL_FIND_CARE_PLAN_BY_ORDER, (mrn, medication_name, primary_diagnosis))
+
+
+def find_duplicate_submission(
+    first_name: str, last_name: str, mrn: str, medication_name: str, today: date
+) -> Optional[dict]:
+    """Find a care plan with same patient (name + MRN) and medication submitted today (UTC)."""
+    return _fetch_one(
+        SQL_FIND_DUPLICATE_SUBMISSION,
+        (first_name, last_name, mrn, medication_name, *_day_bounds(today))
+    )
+
+
+def find_previous_submission(mrn: str, medication_name: str, today: date) -> Optional[dict]:
+    """Find a care plan with same patient MRN and medication from before today (UTC)."""
+    return _fetch_one(SQL_FIND_PREVIOUS_SUBMISSION, (mrn, medication_name, today.isoformat()))
+
+
+def insert_care_plan(row: tuple, generated_plan: str) -> int:
+    """
+    Insert a care plan and return the new ID.
+    row holds the request fields in SQL_INSERT_CARE_PLAN column order
+    (see CarePlanRequest.as_insert_row).
+    """
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT * FROM care_plans 
-               WHERE patient_mrn = ? 
-               AND LOWER(medication_name) = LOWER(?) 
-               AND LOWER(primary_diagnosis) = LOWER(?)""",
-            (mrn, medication_name, primary_diagnosis)
-        )
-        row = cursor.fetchone()
-        return dict(row) if row else None
-
-
-def find_duplicate_submission(first_name: str, last_name: str, mrn: str, medication_name: str) -> Optional[dict]:
-    """Find a care plan with same patient (name + MRN) and medication submitted today."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT * FROM care_plans 
-               WHERE LOWER(patient_first_name) = LOWER(?) 
-               AND LOWER(patient_last_name) = LOWER(?)
-               AND patient_mrn = ?
-               AND LOWER(medication_name) = LOWER(?)
-               AND DATE(created_at) = DATE('now')""",
-            (first_name, last_name, mrn, medication_name)
-        )
-        row = cursor.fetchone()
-        return dict(row) if row else None
-
-
-def find_previous_submission(mrn: str, medication_name: str) -> Optional[dict]:
-    """Find a care plan with same patient MRN and medication from a previous day."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """SELECT * FROM care_plans 
-               WHERE patient_mrn = ?
-               AND LOWER(medication_name) = LOWER(?)
-               AND DATE(created_at) < DATE('now')""",
-            (mrn, medication_name)
-        )
-        row = cursor.fetchone()
-        return dict(row) if row else None
-
-
-def _list_to_csv(value) -> str:
-    """Convert a list to comma-separated string for storage."""
-    if isinstance(value, list):
-        return ", ".join(value)
-    return value or ""
-
-
-def insert_care_plan(data: dict, generated_plan: str) -> int:
-    """Insert a care plan and return the new ID."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO care_plans 
-               (patient_first_name, patient_last_name, referring_provider, 
-                referring_provider_npi, patient_mrn, primary_diagnosis, 
-                medication_name, additional_diagnoses, medication_history, 
-                patient_records, generated_plan)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                data["patient_first_name"],
-                data["patient_last_name"],
-                data["referring_provider"],
-                data["referring_provider_npi"],
-                data["patient_mrn"],
-                data["primary_diagnosis"],
-                data["medication_name"],
-                _list_to_csv(data.get("additional_diagnoses", [])),
-                _list_to_csv(data.get("medication_history", [])),
-                data.get("patient_records", ""),
-                generated_plan
-            )
-        )
+        cursor = conn.execute(SQL_INSERT_CARE_PLAN, (*row, generated_plan))
         return cursor.lastrowid
 
 
-def get_all_care_plans() -> List[dict]:
-    """Get all care plans for export."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM care_plans ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+def iter_care_plan_rows(columns: Sequence[str], batch_size: int = 1000) -> Iterator[List[tuple]]:
+    """
+    Yield all care plans for export, newest first, as batches of plain
+    tuples in the given column order. Memory stays bounded by batch_size.
+    Each batch is its own short query (keyset paging on id), so a slow
+    download neither holds a pooled connection nor pins a read snapshot
+    that would stop WAL checkpoints. Rows inserted meanwhile get higher
+    ids and are not included.
+    """
+    unknown = set(columns) - set(CARE_PLAN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown care plan column(s): {', '.join(sorted(unknown))}")
+    # id follows insertion order, as created_at (always CURRENT_TIMESTAMP)
+    # does; walking the primary key backwards needs no sort. id is selected
+    # first as the paging key and stripped from the yielded rows.
+    select = f"SELECT id, {', '.join(columns)} FROM care_plans"
+    first_page = f"{select} ORDER BY id DESC LIMIT ?"
+    next_page = f"{select} WHERE id < ? ORDER BY id DESC LIMIT ?"
+    
+    last_id = None
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # tuples, not sqlite3.Row
+            if last_id is None:
+                rows = cursor.execute(first_page, (batch_size,)).fetchall()
+            else:
+                rows = cursor.execute(next_page, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [row[1:] for row in rows]
+        if len(rows) < batch_size:
+            return
 
 
 # --- Provider queries ---
 
+SQL_FIND_PROVIDER_BY_NPI = "SELECT name, npi FROM providers WHERE npi = ?"
+
+SQL_FIND_PROVIDER_BY_NAME = "SELECT name, npi FROM providers WHERE name = ? COLLATE NOCASE"
+
+SQL_INSERT_PROVIDER = "INSERT OR IGNORE INTO providers (name, npi) VALUES (?, ?)"
+
+
 def find_provider_by_npi(npi: str) -> Optional[dict]:
     """Find a provider by NPI."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM providers WHERE npi = ?", (npi,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+    return _fetch_one(SQL_FIND_PROVIDER_BY_NPI, (npi,))
 
 
 def find_provider_by_name(name: str) -> Optional[dict]:
     """Find a provider by name (case-insensitive)."""
+    return _fetch_one(SQL_FIND_PROVIDER_BY_NAME, (name,))
+
+
+# Provider conflicts are decided in SQL: each subquery returns the
+# registered value only when it disagrees with the submitted one. The
+# submitted values come from a one-row-per-submission "req" CTE.
+_PROVIDER_CONFLICT_COLUMNS = """
+        (SELECT npi FROM providers
+         WHERE name = req.provider_name COLLATE NOCASE AND npi <> req.provider_npi) AS conflicting_npi,
+        (SELECT name FROM providers
+         WHERE npi = req.provider_npi AND name <> req.provider_name COLLATE NOCASE) AS conflicting_name,
+        EXISTS(SELECT 1 FROM providers WHERE npi = req.provider_npi) AS provider_registered
+"""
+
+SQL_FIND_PROVIDER_CONFLICTS = f"""
+    WITH req(provider_name, provider_npi) AS (VALUES (?, ?))
+    SELECT {_PROVIDER_CONFLICT_COLUMNS} FROM req
+"""
+
+# Every lookup needed to vet a submission: existence flags for the
+# blocking duplicate and the duplicate warnings, plus the provider
+# conflict columns. Each flag is a correlated subquery on an index.
+_DUPLICATE_SIGNAL_COLUMNS = f"""
+        EXISTS(
+            SELECT 1 FROM care_plans
+            WHERE patient_first_name = req.first_name COLLATE NOCASE
+            AND patient_last_name = req.last_name COLLATE NOCASE
+            AND patient_mrn = req.mrn
+            AND medication_name = req.medication_name COLLATE NOCASE
+            AND created_at >= req.day_start AND created_at < req.day_end
+        ) AS duplicate_hit,
+        EXISTS(
+            SELECT 1 FROM care_plans WHERE patient_mrn = req.mrn
+        ) AS mrn_hit,
+        EXISTS(
+            SELECT 1 FROM care_plans
+            WHERE patient_first_name = req.first_name COLLATE NOCASE
+            AND patient_last_name = req.last_name COLLATE NOCASE
+        ) AS name_hit,
+        EXISTS(
+            SELECT 1 FROM care_plans
+            WHERE patient_mrn = req.mrn
+            AND medication_name = req.medication_name COLLATE NOCASE
+            AND created_at < req.day_start
+        ) AS previous_hit,
+        {_PROVIDER_CONFLICT_COLUMNS}
+"""
+
+# mrn, first_name, last_name, medication_name, provider_name, provider_npi, today
+SIGNAL_PARAM_COUNT = 7
+
+# Submissions looked up by one collect_duplicate_signals_many() statement
+MAX_SIGNAL_BATCH = 32
+
+
+@lru_cache(maxsize=MAX_SIGNAL_BATCH)
+def _duplicate_signals_sql(count: int) -> str:
+    """
+    One statement vetting count submissions, one result row each, in
+    order. Texts are cached per count so the prepared statements are too.
+    """
+    rows = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, ?)"] * count)
+    return f"""
+    WITH req(pos, mrn, first_name, last_name, medication_name, provider_name, provider_npi,
+             day_start, day_end)
+        AS (VALUES {rows})
+    SELECT {_DUPLICATE_SIGNAL_COLUMNS} FROM req ORDER BY pos
+"""
+
+
+def _provider_conflicts(row: sqlite3.Row) -> dict:
+    return {
+        "conflicting_npi": row["conflicting_npi"],
+        "conflicting_name": row["conflicting_name"],
+        "provider_registered": bool(row["provider_registered"]),
+    }
+
+
+def find_provider_conflicts(name: str, npi: str) -> dict:
+    """
+    Compare a provider against the registry (names case-insensitively).
+    Returns conflicting_npi (NPI registered under this name, if different),
+    conflicting_name (name registered to this NPI, if different) and
+    provider_registered (whether the NPI is registered at all).
+    """
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM providers WHERE LOWER(name) = LOWER(?)", (name,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        row = conn.execute(SQL_FIND_PROVIDER_CONFLICTS, (name, npi)).fetchone()
+        return _provider_conflicts(row)
+
+
+def collect_duplicate_signals(
+    mrn: str,
+    first_name: str,
+    last_name: str,
+    medication_name: str,
+    provider_name: str,
+    provider_npi: str,
+    today: date,
+) -> dict:
+    """
+    Look up everything needed to vet a submission in one statement.
+    Returns duplicate_hit, mrn_hit, name_hit and previous_hit as booleans,
+    relative to today (UTC), plus the find_provider_conflicts() fields.
+    """
+    return collect_duplicate_signals_many(
+        [(mrn, first_name, last_name, medication_name, provider_name, provider_npi, today)]
+    )[0]
+
+
+def collect_duplicate_signals_many(submissions: Sequence[tuple]) -> List[dict]:
+    """
+    collect_duplicate_signals() for up to MAX_SIGNAL_BATCH submissions in
+    a single statement. Each item holds the same seven arguments, in the
+    same order; results come back in submission order.
+    """
+    if not 0 < len(submissions) <= MAX_SIGNAL_BATCH:
+        raise ValueError(f"Expected 1 to {MAX_SIGNAL_BATCH} submissions, got {len(submissions)}")
+    params = []
+    for pos, submission in enumerate(submissions):
+        if len(submission) != SIGNAL_PARAM_COUNT:
+            raise ValueError(f"Expected {SIGNAL_PARAM_COUNT} values per submission, got {len(submission)}")
+        *fields, today = submission
+        params.append(pos)
+        params.extend(fields)
+        params.extend(_day_bounds(today))
+    
+    with get_db() as conn:
+        rows = conn.execute(_duplicate_signals_sql(len(submissions)), params).fetchall()
+    return [
+        {
+            "duplicate_hit": bool(row["duplicate_hit"]),
+            "mrn_hit": bool(row["mrn_hit"]),
+            "name_hit": bool(row["name_hit"]),
+            "previous_hit": bool(row["previous_hit"]),
+            **_provider_conflicts(row),
+        }
+        for row in rows
+    ]
 
 
 def insert_provider(name: str, npi: str) -> bool:
     """Insert a provider if not exists. Returns True if inserted."""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR IGNORE INTO providers (name, npi) VALUES (?, ?)",
-            (name, npi)
-        )
+        cursor = conn.execute(SQL_INSERT_PROVIDER, (name, npi))
         return cursor.rowcount > 0
+
+
+def insert_care_plan_with_provider(
+    row: tuple,
+    generated_plan: str,
+    provider_name: str,
+    provider_npi: str,
+) -> int:
+    """
+    Insert the referring provider (if not exists) and the care plan in a
+    single transaction. Returns the new care plan ID.
+    """
+    with get_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(SQL_INSERT_PROVIDER, (provider_name, provider_npi))
+        cursor = conn.execute(SQL_INSERT_CARE_PLAN, (*row, generated_plan))
+        return cursor.lastrowid
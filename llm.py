@@ -1,5 +1,5 @@
 import os
-from openai import OpenAI
+from openai import AsyncOpenAI
 from models import CarePlanRequest
 
 
@@ -8,22 +8,34 @@ class CarePlanGenerationError(Exception):
     pass
 
 
-def generate_care_plan(data: CarePlanRequest) -> str:
-    """Generate a care plan using OpenAI. Raises CarePlanGenerationError on failure."""
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise CarePlanGenerationError(
-            "OPENAI_API_KEY environment variable is not set. "
-            "Please run: export OPENAI_API_KEY='your-api-key-here'"
-        )
-    
-    client = OpenAI(api_key=api_key)
-    
-    # Format lists for display
+# Shared client so its HTTP connection pool is reused across requests
+_API_KEY = os.getenv("OPENAI_API_KEY")
+_CLIENT = AsyncOpenAI(api_key=_API_KEY) if _API_KEY else None
+
+
+SYSTEM_PROMPT = (
+    "You are a clinical pharmacist assistant helping to generate care plans "
+    "for specialty pharmacy patients."
+)
+
+# Static tail of every prompt, built once at import
+PROMPT_INSTRUCTIONS = """
+Please generate a care plan with ONLY the following four sections:
+
+1. Problem List / Drug Therapy Problems (DTPs)
+2. Goals (SMART)
+3. Pharmacist Interventions / Plan
+4. Monitoring Plan & Lab Schedule
+"""
+
+
+def build_prompt(data: CarePlanRequest) -> str:
+    """Build the user prompt for a care plan request."""
+    # Format lists for display; skip the join entirely when empty
     additional_dx = ", ".join(data.additional_diagnoses) if data.additional_diagnoses else "None"
     med_history = ", ".join(data.medication_history) if data.medication_history else "None"
     
-    prompt = f"""Generate a clinical care plan for the following patient:
+    return f"""Generate a clinical care plan for the following patient:
 
 Patient: {data.patient_first_name} {data.patient_last_name}
 MRN: {data.patient_mrn}
@@ -35,20 +47,28 @@ Medication History: {med_history}
 
 Patient Records:
 {data.patient_records or 'No additional records provided'}
+{PROMPT_INSTRUCTIONS}"""
 
-Please generate a care plan with ONLY the following four sections:
 
-1. Problem List / Drug Therapy Problems (DTPs)
-2. Goals (SMART)
-3. Pharmacist Interventions / Plan
-4. Monitoring Plan & Lab Schedule
-"""
+async def generate_care_plan(data: CarePlanRequest) -> str:
+    """
+    Generate a care plan using OpenAI. Raises CarePlanGenerationError on failure.
+    The completion is requested whole, not streamed: /submit returns one JSON
+    body carrying the saved ID, and plans are capped at max_tokens (a few KB).
+    """
+    if _CLIENT is None:
+        raise CarePlanGenerationError(
+            "OPENAI_API_KEY environment variable is not set. "
+            "Please run: export OPENAI_API_KEY='your-api-key-here'"
+        )
+    
+    prompt = build_prompt(data)
     
     try:
-        response = client.chat.completions.create(
+        response = await _CLIENT.chat.completions.create(
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": "You are a clinical pharmacist assistant helping to generate care plans for specialty pharmacy patients."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
@@ -2,26 +2,48 @@
 Transport layer - HTTP routes only.
 Handles request/response, delegates to services for business logic.
 """
+import asyncio
 import csv
 import io
+from functools import lru_cache
+from itertools import chain
 from fastapi import FastAPI, Request, Form, File, UploadFile
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import ValidationError
 
-from database import init_db, get_all_care_plans
+from database import init_db, optimize_db, close_pool, iter_care_plan_rows
 from models import CarePlanRequest
 from services import create_care_plan, DuplicateSubmissionError, ProviderConflictError
 from llm import CarePlanGenerationError
-from pdf_utils import extract_text_from_pdf
+from pdf_utils import extract_text_from_pdf, looks_like_pdf, PDF_HEADER_WINDOW
 
-app = FastAPI(title="Care Plan Generator")
+# orjson serializes the large generated_plan strings much faster than json
+app = FastAPI(title="Care Plan Generator", default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="templates")
 
+# How often to run PRAGMA optimize while the server is up
+OPTIMIZE_INTERVAL_SECONDS = 3600
+
+
+async def periodic_optimize():
+    """Keep SQLite planner statistics fresh for long-running processes."""
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL_SECONDS)
+        await asyncio.to_thread(optimize_db)
+
 
 @app.on_event("startup")
-def startup():
+async def startup():
     init_db()
+    app.state.optimize_task = asyncio.create_task(periodic_optimize())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.optimize_task.cancel()
+    optimize_db()
+    close_pool()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -30,6 +52,70 @@ async def home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+# Validated requests kept for identical resubmissions (retries, double clicks)
+REQUEST_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=REQUEST_CACHE_SIZE)
+def _validate_fields(
+    patient_first_name: str,
+    patient_last_name: str,
+    referring_provider: str,
+    referring_provider_npi: str,
+    patient_mrn: str,
+    primary_diagnosis: str,
+    medication_name: str,
+    additional_diagnoses: str,
+    medication_history: str,
+) -> CarePlanRequest:
+    return CarePlanRequest(
+        patient_first_name=patient_first_name,
+        patient_last_name=patient_last_name,
+        referring_provider=referring_provider,
+        referring_provider_npi=referring_provider_npi,
+        patient_mrn=patient_mrn,
+        primary_diagnosis=primary_diagnosis,
+        medication_name=medication_name,
+        additional_diagnoses=additional_diagnoses,
+        medication_history=medication_history,
+    )
+
+
+def validate_request(
+    patient_first_name: str,
+    patient_last_name: str,
+    referring_provider: str,
+    referring_provider_npi: str,
+    patient_mrn: str,
+    primary_diagnosis: str,
+    medication_name: str,
+    additional_diagnoses: str,
+    medication_history: str,
+    patient_records: str,
+) -> CarePlanRequest:
+    """
+    Validate form fields into a CarePlanRequest. The short fields are
+    memoized on their exact values; patient_records (free text or PDF
+    extract, and unconstrained) is never cached and is attached per call.
+    ValidationError is never cached, so invalid input is re-checked.
+    Returned instances share their list fields; callers must not mutate them.
+    """
+    data = _validate_fields(
+        patient_first_name,
+        patient_last_name,
+        referring_provider,
+        referring_provider_npi,
+        patient_mrn,
+        primary_diagnosis,
+        medication_name,
+        additional_diagnoses,
+        medication_history,
+    )
+    if not patient_records:
+        return data
+    return data.model_copy(update={"patient_records": patient_records})
+
+
 @app.post("/submit")
 async def submit_care_plan(
     patient_first_name: str = Form(...),
@@ -53,70 +139,80 @@ async def submit_care_plan(
     combined_records = patient_records
     if patient_records_file and patient_records_file.filename:
         if not patient_records_file.filename.lower().endswith(".pdf"):
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={"success": False, "errors": ["Only PDF files are supported for patient records upload"]}
             )
+        # Check the magic number before handing the upload to the parser
+        head = await patient_records_file.read(PDF_HEADER_WINDOW)
+        if not looks_like_pdf(head):
+            return ORJSONResponse(
+                status_code=400,
+                content={"success": False, "errors": ["Uploaded file is not a valid PDF"]}
+            )
         try:
-            file_bytes = await patient_records_file.read()
-            pdf_text = extract_text_from_pdf(file_bytes)
+            # The upload is already spooled (memory, or disk when large);
+            # parse it in place rather than reading it into a bytes copy
+            await patient_records_file.seek(0)
+            # Parsing large PDFs is CPU-bound; keep it off the event loop
+            pdf_text = await asyncio.to_thread(extract_text_from_pdf, patient_records_file.file)
             if combined_records:
                 combined_records = f"{combined_records}\n\n--- Extracted from PDF ---\n\n{pdf_text}"
             else:
                 combined_records = pdf_text
         except ValueError as e:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=400,
                 content={"success": False, "errors": [str(e)]}
             )
     
     # Validate input
     try:
-        data = CarePlanRequest(
-            patient_first_name=patient_first_name,
-            patient_last_name=patient_last_name,
-            referring_provider=referring_provider,
-            referring_provider_npi=referring_provider_npi,
-            patient_mrn=patient_mrn,
-            primary_diagnosis=primary_diagnosis,
-            medication_name=medication_name,
-            additional_diagnoses=additional_diagnoses,
-            medication_history=medication_history,
-            patient_records=combined_records,
+        data = validate_request(
+            patient_first_name,
+            patient_last_name,
+            referring_provider,
+            referring_provider_npi,
+            patient_mrn,
+            primary_diagnosis,
+            medication_name,
+            additional_diagnoses,
+            medication_history,
+            combined_records,
         )
     except ValidationError as e:
         errors = [err["msg"] for err in e.errors()]
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=400,
             content={"success": False, "errors": errors}
         )
     
     # Create care plan (business logic)
     try:
-        result = create_care_plan(data)
+        result = await create_care_plan(data)
     except DuplicateSubmissionError as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=409,
             content={"success": False, "errors": [str(e)]}
         )
     except ProviderConflictError as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=409,
             content={"success": False, "errors": [str(e)]}
         )
     except CarePlanGenerationError as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={"success": False, "errors": [str(e)]}
         )
     except Exception:
         # Catch-all for unexpected errors - don't expose internals
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"success": False, "errors": ["An unexpected error occurred. Please try again or contact support."]}
         )
     
-    return JSONResponse(content={
+    return ORJSONResponse(content={
         "success": True,
         "id": result.id,
         "warnings": result.warnings,
@@ -124,29 +220,43 @@ async def submit_care_plan(
     })
 
 
+EXPORT_COLUMNS = (
+    "id", "patient_first_name", "patient_last_name", "patient_mrn",
+    "referring_provider", "referring_provider_npi", "primary_diagnosis",
+    "medication_name", "additional_diagnoses", "medication_history",
+    "patient_records", "generated_plan", "created_at"
+)
+
+# Rows fetched from SQLite and sent to the client per chunk
+EXPORT_BATCH_SIZE = 1000
+
+
+def iter_csv_chunks(batches):
+    """Render batches of care plan rows as UTF-8 CSV, yielding one chunk per batch."""
+    # Encode while writing so chunks leave as bytes without a second pass
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
 @app.get("/export")
-async def export_care_plans():
+def export_care_plans():
     """Export all care plans as CSV for pharma reporting."""
-    care_plans = get_all_care_plans()
-    
-    if not care_plans:
-        return JSONResponse(content={"error": "No care plans to export"}, status_code=404)
+    batches = iter_care_plan_rows(EXPORT_COLUMNS, EXPORT_BATCH_SIZE)
+    first = next(batches, None)
     
-    # Create CSV in memory - include all fields
-    output = io.StringIO()
-    fieldnames = [
-        "id", "patient_first_name", "patient_last_name", "patient_mrn",
-        "referring_provider", "referring_provider_npi", "primary_diagnosis",
-        "medication_name", "additional_diagnoses", "medication_history",
-        "patient_records", "generated_plan", "created_at"
-    ]
-    writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction="ignore")
-    writer.writeheader()
-    writer.writerows(care_plans)
+    if first is None:
+        return ORJSONResponse(content={"error": "No care plans to export"}, status_code=404)
     
-    output.seek(0)
+    # Stream CSV as rows are read - include all fields
     return StreamingResponse(
-        iter([output.getvalue()]),
+        iter_csv_chunks(chain([first], batches)),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=care_plans_export.csv"}
     )
@@ -1,17 +1,24 @@
 from typing import List
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 import re
 
-# ICD-10 pattern: letter followed by 2 digits, optional decimal with 1-4 digits
-ICD10_PATTERN = r"^[A-Z]\d{2}(\.\d{1,4})?$"
+# ICD-10 pattern: letter followed by 2 digits, optional decimal with 1-4 digits.
+# Matched with fullmatch, so no anchors are needed; [0-9] rather than \d
+# keeps non-ASCII digits out.
+ICD10_PATTERN = r"[A-Z][0-9]{2}(?:\.[0-9]{1,4})?"
+_ICD10_RE = re.compile(ICD10_PATTERN)
 
 
 def is_valid_icd10(code: str) -> bool:
     """Check if a string is a valid ICD-10 code."""
-    return bool(re.match(ICD10_PATTERN, code.upper()))
+    return _ICD10_RE.fullmatch(code.upper()) is not None
 
 
 class CarePlanRequest(BaseModel):
+    # Fields cannot be reassigned, so validated instances can be cached and
+    # shared (the lists themselves are still mutable; nothing mutates them)
+    model_config = ConfigDict(frozen=True)
+
     patient_first_name: str = Field(..., min_length=1)
     patient_last_name: str = Field(..., min_length=1)
     referring_provider: str = Field(..., min_length=1)
@@ -53,18 +60,27 @@ class CarePlanRequest(BaseModel):
     def parse_additional_diagnoses(cls, v) -> List[str]:
         """Parse comma-separated string into list of validated ICD-10 codes."""
         if isinstance(v, list):
-            codes = [c.strip() for c in v if c and c.strip()]
+            raw_codes = v
         elif isinstance(v, str):
-            if not v or not v.strip():
-                return []
-            codes = [c.strip() for c in v.split(",") if c.strip()]
+            raw_codes = v.split(",")
         else:
             return []
         
-        invalid = [c for c in codes if not is_valid_icd10(c)]
+        # Single pass: strip, uppercase once, and validate with the compiled pattern
+        codes, invalid = [], []
+        for raw in raw_codes:
+            code = raw.strip() if raw else ""
+            if not code:
+                continue
+            upper = code.upper()
+            if _ICD10_RE.fullmatch(upper):
+                codes.append(upper)
+            else:
+                invalid.append(code)
+        
         if invalid:
             raise ValueError(f"Invalid ICD-10 code(s): {', '.join(invalid)}")
-        return [c.upper() for c in codes]
+        return codes
 
     @field_validator("medication_history", mode="before")
     @classmethod
@@ -79,6 +95,25 @@ class CarePlanRequest(BaseModel):
         else:
             return []
 
+    def as_insert_row(self) -> tuple:
+        """
+        Field values in the care_plans INSERT column order
+        (database.SQL_INSERT_CARE_PLAN, minus generated_plan).
+        List fields are stored comma-separated.
+        """
+        return (
+            self.patient_first_name,
+            self.patient_last_name,
+            self.referring_provider,
+            self.referring_provider_npi,
+            self.patient_mrn,
+            self.primary_diagnosis,
+            self.medication_name,
+            ", ".join(self.additional_diagnoses),
+            ", ".join(self.medication_history),
+            self.patient_records,
+        )
+
 
 class CarePlanResponse(BaseModel):
     id: int
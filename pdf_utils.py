@@ -2,15 +2,33 @@
 PDF text extraction utilities.
 """
 from io import BytesIO
+from typing import BinaryIO, Union
 from pypdf import PdfReader
 
+PDF_MAGIC = b"%PDF-"
+# Readers accept the header anywhere in the first 1024 bytes
+PDF_HEADER_WINDOW = 1024
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+
+def looks_like_pdf(head: bytes) -> bool:
+    """
+    Check the leading bytes of a file for the PDF header.
+    
+    Args:
+        head: The first PDF_HEADER_WINDOW bytes (or fewer) of the file
+        
+    Returns:
+        True if the PDF magic number is present
+    """
+    return PDF_MAGIC in head[:PDF_HEADER_WINDOW]
+
+
+def extract_text_from_pdf(source: Union[bytes, BinaryIO]) -> str:
     """
     Extract text content from a PDF file.
     
     Args:
-        file_bytes: Raw bytes of the PDF file
+        source: Raw bytes of the PDF file, or a seekable binary file object
         
     Returns:
         Extracted text content as a string
@@ -19,15 +37,11 @@ def extract_text_from_pdf(file_bytes: bytes) -> str:
         ValueError: If the PDF cannot be parsed
     """
     try:
-        pdf_file = BytesIO(file_bytes)
+        pdf_file = BytesIO(source) if isinstance(source, bytes) else source
         reader = PdfReader(pdf_file)
         
-        text_parts = []
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_parts.append(page_text)
-        
-        return "\n\n".join(text_parts)
+        # Default (plain) extraction mode; empty pages are dropped
+        page_texts = (page.extract_text() for page in reader.pages)
+        return "\n\n".join([text for text in page_texts if text])
     except Exception as e:
         raise ValueError(f"Failed to parse PDF: {str(e)}")
@@ -1,11 +1,16 @@
 """
 Business logic layer - Orchestrates operations and enforces business rules.
 """
-from typing import List
+import asyncio
+import string
+import weakref
+from datetime import date, datetime, timezone
+from typing import List, Optional
 from dataclasses import dataclass
 
 from models import CarePlanRequest
 from llm import generate_care_plan
+# Used as db.<function> at call time, so tests can patch services.db
 import database as db
 
 
@@ -27,36 +32,123 @@ class CarePlanResult:
     generated_plan: str
 
 
-def check_duplicate_warnings(data: CarePlanRequest) -> List[str]:
+@dataclass
+class SubmissionCheck:
+    """Outcome of the pre-generation checks for a submission."""
+    warnings: List[str]
+    provider_exists: bool
+
+
+def _signal_params(data: CarePlanRequest) -> tuple:
+    """Submission fields for db.collect_duplicate_signals, in order (the day follows)."""
+    return (
+        data.patient_mrn,
+        data.patient_first_name,
+        data.patient_last_name,
+        data.medication_name,
+        data.referring_provider,
+        data.referring_provider_npi
+    )
+
+
+def get_duplicate_signals(data: CarePlanRequest, today: Optional[date] = None) -> dict:
+    """
+    Fetch everything the submission checks need in a single query.
+    Same-day checks are relative to today (UTC) unless another day is given.
+    """
+    return db.collect_duplicate_signals(*_signal_params(data), today or _utc_today())
+
+
+class SignalBatcher:
+    """
+    Coalesces concurrent duplicate-signal lookups into one
+    collect_duplicate_signals_many() statement. The first caller starts a
+    drain task that fetches everything queued so far in one worker-thread
+    hop; callers arriving meanwhile join the next batch. There is no timer,
+    so an idle server adds no latency. Bound to a single event loop (see
+    _get_signal_batcher).
+    """
+
+    def __init__(self, max_batch: int = db.MAX_SIGNAL_BATCH):
+        self.max_batch = max_batch
+        self._pending = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def collect(self, data: CarePlanRequest, today: date) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((*_signal_params(data), today), future))
+        # The loop only holds weak references to tasks; keep our own
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+        return await future
+
+    async def _drain(self) -> None:
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            try:
+                results = await asyncio.to_thread(
+                    db.collect_duplicate_signals_many, [params for params, _ in batch]
+                )
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"Expected {len(batch)} duplicate signal rows, got {len(results)}"
+                    )
+            except asyncio.CancelledError:
+                # Nobody is left to serve the queue; release every waiter
+                for _, future in batch + self._pending:
+                    future.cancel()
+                self._pending.clear()
+                raise
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                # A caller may have been cancelled (client disconnected)
+                if not future.done():
+                    future.set_result(result)
+
+
+# One batcher per event loop: futures and tasks cannot cross loops
+_signal_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SignalBatcher]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_signal_batcher() -> SignalBatcher:
+    loop = asyncio.get_running_loop()
+    batcher = _signal_batchers.get(loop)
+    if batcher is None:
+        batcher = _signal_batchers[loop] = SignalBatcher()
+    return batcher
+
+
+def check_duplicate_warnings(data: CarePlanRequest, signals: Optional[dict] = None) -> List[str]:
     """
     Check for potential duplicates and return warning messages.
     Does not block submission - just warns the user.
+    Uses prefetched duplicate signals when given.
     """
+    if signals is None:
+        signals = get_duplicate_signals(data)
+    
     warnings = []
     
     # Check for duplicate patient by MRN
-    existing_by_mrn = db.find_care_plan_by_mrn(data.patient_mrn)
-    if existing_by_mrn:
+    if signals["mrn_hit"]:
         warnings.append(
             f"Warning: Patient with MRN {data.patient_mrn} already exists in the system."
         )
-    else:
-        # Only check by name if MRN didn't match (avoid double warning)
-        existing_by_name = db.find_care_plan_by_patient_name(
-            data.patient_first_name, 
-            data.patient_last_name
+    # Only check by name if MRN didn't match (avoid double warning)
+    elif signals["name_hit"]:
+        warnings.append(
+            f"Warning: Patient with name {data.patient_first_name} {data.patient_last_name} may already exist."
         )
-        if existing_by_name:
-            warnings.append(
-                f"Warning: Patient with name {data.patient_first_name} {data.patient_last_name} may already exist."
-            )
     
     # Check for same patient + same medication on a previous day
-    previous_submission = db.find_previous_submission(
-        data.patient_mrn,
-        data.medication_name
-    )
-    if previous_submission:
+    if signals["previous_hit"]:
         warnings.append(
             f"Warning: This patient (MRN: {data.patient_mrn}) already has a care plan "
             f"for {data.medication_name} from a previous date."
@@ -65,48 +157,152 @@ def check_duplicate_warnings(data: CarePlanRequest) -> List[str]:
     return warnings
 
 
-def check_blocking_provider_conflict(name: str, npi: str) -> None:
+def check_blocking_provider_conflict(name: str, npi: str, signals: Optional[dict] = None) -> None:
     """
     Check for provider conflicts that should block submission.
     Raises ProviderConflictError if conflict found.
+    Uses prefetched duplicate signals when given.
     """
+    if signals is None:
+        signals = db.find_provider_conflicts(name, npi)
+    
     # Check if provider name exists with a different NPI - this is blocked
-    existing_by_name = db.find_provider_by_name(name)
-    if existing_by_name and existing_by_name["npi"] != npi:
+    registered_npi = signals["conflicting_npi"]
+    if registered_npi is not None:
         raise ProviderConflictError(
-            f"Provider '{name}' is already registered with NPI {existing_by_name['npi']}. "
+            f"Provider '{name}' is already registered with NPI {registered_npi}. "
             f"Cannot register same provider with different NPI ({npi})."
         )
     
     # Check if NPI exists with a different name - this is also blocked
-    existing_by_npi = db.find_provider_by_npi(npi)
-    if existing_by_npi and existing_by_npi["name"].lower() != name.lower():
+    registered_name = signals["conflicting_name"]
+    if registered_name is not None:
         raise ProviderConflictError(
-            f"NPI {npi} is already registered to provider '{existing_by_npi['name']}'. "
+            f"NPI {npi} is already registered to provider '{registered_name}'. "
             f"Cannot register different provider name ('{name}') with same NPI."
         )
 
 
-def check_blocking_duplicate(data: CarePlanRequest) -> None:
+def check_blocking_duplicate(data: CarePlanRequest, signals: Optional[dict] = None) -> None:
     """
     Check for exact duplicate submissions that should be blocked.
     Raises DuplicateSubmissionError if duplicate found.
+    Uses prefetched duplicate signals when given.
     """
-    existing = db.find_duplicate_submission(
-        data.patient_first_name,
-        data.patient_last_name,
-        data.patient_mrn,
-        data.medication_name
+    if signals is None:
+        existing = db.find_duplicate_submission(
+            data.patient_first_name,
+            data.patient_last_name,
+            data.patient_mrn,
+            data.medication_name,
+            _utc_today()
+        )
+        signals = {"duplicate_hit": existing is not None}
+    
+    if signals["duplicate_hit"]:
+        raise _duplicate_error(data)
+
+
+def _duplicate_error(data: CarePlanRequest) -> DuplicateSubmissionError:
+    return DuplicateSubmissionError(
+        f"A care plan for {data.patient_first_name} {data.patient_last_name} "
+        f"(MRN: {data.patient_mrn}) with medication {data.medication_name} "
+        f"was already submitted today."
     )
-    if existing:
-        raise DuplicateSubmissionError(
-            f"A care plan for {data.patient_first_name} {data.patient_last_name} "
-            f"(MRN: {data.patient_mrn}) with medication {data.medication_name} "
-            f"was already submitted today."
+
+
+# SQLite's NOCASE folds ASCII letters only; match it exactly
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _utc_today() -> date:
+    # created_at defaults to CURRENT_TIMESTAMP, which is UTC
+    return datetime.now(timezone.utc).date()
+
+
+class TodaySubmissions:
+    """
+    Duplicate keys (name + MRN + medication) of care plans this process
+    saved today. Only positive hits are trusted: a key found here is a
+    certain duplicate, while a miss still falls through to the database
+    check, since other workers and earlier runs are not tracked.
+    """
+
+    def __init__(self):
+        self._date = _utc_today()
+        self._keys = set()
+
+    @staticmethod
+    def key(data: CarePlanRequest) -> tuple:
+        return (
+            data.patient_first_name.translate(_ASCII_LOWER),
+            data.patient_last_name.translate(_ASCII_LOWER),
+            data.patient_mrn,
+            data.medication_name.translate(_ASCII_LOWER),
         )
 
+    def _roll_over(self) -> None:
+        today = _utc_today()
+        if today != self._date:
+            self._date = today
+            self._keys = set()
+
+    def __contains__(self, key: tuple) -> bool:
+        self._roll_over()
+        return key in self._keys
+
+    def add(self, key: tuple, day: date) -> None:
+        """Record a saved submission's key; ignored if it belongs to an earlier day."""
+        self._roll_over()
+        if day == self._date:
+            self._keys.add(key)
+
+
+_today_submissions = TodaySubmissions()
+
+
+def vet_submission(data: CarePlanRequest, signals: Optional[dict] = None) -> SubmissionCheck:
+    """
+    Run every pre-generation check against the database.
+    Raises DuplicateSubmissionError / ProviderConflictError when blocked,
+    otherwise returns the (non-blocking) duplicate warnings.
+    Uses prefetched duplicate signals when given.
+    """
+    # Every check below reads from this one query
+    if signals is None:
+        signals = get_duplicate_signals(data)
+    
+    # Block exact duplicates
+    check_blocking_duplicate(data, signals)
+    
+    # Block provider conflicts
+    check_blocking_provider_conflict(data.referring_provider, data.referring_provider_npi, signals)
+    
+    # Collect warnings (does not block)
+    warnings = check_duplicate_warnings(data, signals)
+    
+    # With no conflict, a provider registered under this NPI is this same provider
+    return SubmissionCheck(
+        warnings=warnings,
+        provider_exists=signals["provider_registered"]
+    )
+
 
-def create_care_plan(data: CarePlanRequest) -> CarePlanResult:
+def save_care_plan(data: CarePlanRequest, generated_plan: str, provider_exists: bool = False) -> int:
+    """
+    Persist the provider and care plan. Returns the new care plan ID.
+    Skips the provider insert when the provider is already registered.
+    """
+    row = data.as_insert_row()
+    if provider_exists:
+        return db.insert_care_plan(row, generated_plan)
+    # Provider and care plan share one transaction (one commit)
+    return db.insert_care_plan_with_provider(
+        row, generated_plan, data.referring_provider, data.referring_provider_npi
+    )
+
+
+async def create_care_plan(data: CarePlanRequest) -> CarePlanResult:
     """
     Main business operation: Create a care plan.
     
@@ -116,25 +312,40 @@ def create_care_plan(data: CarePlanRequest) -> CarePlanResult:
     4. Generate care plan via LLM
     5. Save provider and care plan to database
     6. Return result with warnings
-    """
-    # Block exact duplicates
-    check_blocking_duplicate(data)
     
-    # Block provider conflicts
-    check_blocking_provider_conflict(data.referring_provider, data.referring_provider_npi)
+    Database work runs in worker threads and the LLM call is awaited,
+    so the event loop stays free for other requests throughout. Nothing
+    is written until generation succeeds: the provider and care plan are
+    saved together afterwards, so a failed LLM call leaves no trace.
+    Warnings are read from the same lookup as the blocking checks, so
+    they add no query of their own ahead of generation.
+    """
+    # Duplicates saved by this process today need no database round-trip.
+    # The key is folded once and reused when recording the save below.
+    duplicate_key = TodaySubmissions.key(data)
+    if duplicate_key in _today_submissions:
+        raise _duplicate_error(data)
     
-    # Collect warnings (does not block)
-    warnings = check_duplicate_warnings(data)
+    # Concurrent submissions share one lookup round-trip; the checks
+    # themselves are pure and run right here on the event loop. The day
+    # is fixed once and bound into the query rather than computed in SQL.
+    today = _utc_today()
+    signals = await _get_signal_batcher().collect(data, today)
+    check = vet_submission(data, signals)
     
     # Generate care plan
-    generated_plan = generate_care_plan(data)
+    generated_plan = await generate_care_plan(data)
     
-    # Persist data
-    db.insert_provider(data.referring_provider, data.referring_provider_npi)
-    care_plan_id = db.insert_care_plan(data.model_dump(), generated_plan)
+    # Persist data. The day is taken first so a save straddling midnight
+    # can only be forgotten early, never block the next day's submission.
+    saved_on = _utc_today()
+    care_plan_id = await asyncio.to_thread(
+        save_care_plan, data, generated_plan, check.provider_exists
+    )
+    _today_submissions.add(duplicate_key, saved_on)
     
     return CarePlanResult(
         id=care_plan_id,
-        warnings=warnings,
+        warnings=check.warnings,
         generated_plan=generated_plan
     )
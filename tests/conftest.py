@@ -0,0 +1,16 @@
+"""Shared test configuration."""
+import os
+import shutil
+import tempfile
+
+# Point the database module at a private file database before any test
+# module imports it. A real file, not a shared-cache in-memory URI, keeps
+# SQLite's normal locking and busy timeout for concurrent writers.
+# Overriding (not defaulting) keeps a developer's DATABASE_PATH from being
+# touched by the tests.
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="careplan-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_TEST_DB_DIR, "careplan_test.db")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TEST_DB_DIR, ignore_errors=True)
@@ -0,0 +1,216 @@
+"""Tests for schema setup and migration in database."""
+import sqlite3
+from datetime import date
+import pytest
+import database as db
+
+
+TABLES = (
+    """CREATE TABLE care_plans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_first_name TEXT NOT NULL,
+        patient_last_name TEXT NOT NULL,
+        referring_provider TEXT NOT NULL,
+        referring_provider_npi TEXT NOT NULL,
+        patient_mrn TEXT NOT NULL,
+        primary_diagnosis TEXT NOT NULL,
+        medication_name TEXT NOT NULL,
+        additional_diagnoses TEXT,
+        medication_history TEXT,
+        patient_records TEXT,
+        generated_plan TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE providers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        npi TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+)
+
+# Unversioned databases carried LOWER() expression indexes
+V0_INDEXES = (
+    """CREATE INDEX idx_careplans_name_lower
+       ON care_plans(LOWER(patient_first_name), LOWER(patient_last_name))""",
+    """CREATE INDEX idx_careplans_order
+       ON care_plans(patient_mrn, LOWER(medication_name), LOWER(primary_diagnosis))""",
+    "CREATE INDEX idx_providers_name_lower ON providers(LOWER(name))",
+)
+
+# Version 1 switched to NOCASE indexes that were not yet covering
+V1_INDEXES = (
+    """CREATE INDEX idx_careplans_name
+       ON care_plans(patient_first_name COLLATE NOCASE, patient_last_name COLLATE NOCASE)""",
+    """CREATE INDEX idx_careplans_mrn_med_dx
+       ON care_plans(patient_mrn, medication_name COLLATE NOCASE, primary_diagnosis COLLATE NOCASE)""",
+    "CREATE INDEX idx_providers_name ON providers(name COLLATE NOCASE)",
+)
+
+# Version 2 made them covering, with created_at after primary_diagnosis
+V2_INDEXES = (
+    V1_INDEXES[0],
+    """CREATE INDEX idx_careplans_mrn_med_dx_created
+       ON care_plans(patient_mrn, medication_name COLLATE NOCASE,
+                     primary_diagnosis COLLATE NOCASE, created_at)""",
+    "CREATE INDEX idx_providers_name_npi ON providers(name COLLATE NOCASE, npi)",
+)
+
+CURRENT_INDEXES = {
+    "idx_careplans_name",
+    "idx_careplans_mrn_med_created_dx",
+    "idx_providers_name_npi",
+}
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point the database module at a fresh file with its own pool."""
+    path = tmp_path / "careplan.db"
+    db.close_pool()
+    monkeypatch.setattr(db, "DATABASE_PATH", path)
+    yield path
+    db.close_pool()
+
+
+def create_legacy_db(path, indexes, version):
+    conn = sqlite3.connect(path)
+    for statement in (*TABLES, *indexes):
+        conn.execute(statement)
+    conn.execute(
+        "INSERT INTO care_plans (patient_first_name, patient_last_name, referring_provider, "
+        "referring_provider_npi, patient_mrn, primary_diagnosis, medication_name) "
+        "VALUES ('John', 'Doe', 'Dr. Smith', '1234567890', '123456', 'E11.9', 'Humira')"
+    )
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+
+def schema_state(path):
+    conn = sqlite3.connect(path)
+    try:
+        indexes = {
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+            )
+        }
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM care_plans").fetchone()[0]
+    finally:
+        conn.close()
+    return indexes, version, rows
+
+
+class TestInitDb:
+    """Tests for the user_version guarded schema setup."""
+
+    def test_new_database_gets_current_schema(self, db_path):
+        db.init_db()
+
+        indexes, version, rows = schema_state(db_path)
+        assert indexes == CURRENT_INDEXES
+        assert version == db.SCHEMA_VERSION
+        assert rows == 0
+
+    @pytest.mark.parametrize(
+        "legacy_indexes, legacy_version", [(V0_INDEXES, 0), (V1_INDEXES, 1), (V2_INDEXES, 2)]
+    )
+    def test_old_indexes_replaced(self, db_path, legacy_indexes, legacy_version):
+        create_legacy_db(db_path, legacy_indexes, legacy_version)
+
+        db.init_db()
+
+        indexes, version, rows = schema_state(db_path)
+        assert indexes == CURRENT_INDEXES
+        assert version == db.SCHEMA_VERSION
+        assert rows == 1  # data survives the migration
+
+    def test_current_version_skips_ddl(self, db_path):
+        db.init_db()
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP INDEX idx_providers_name_npi")
+        conn.commit()
+        conn.close()
+
+        db.init_db()
+
+        # The guard returned before recreating the index
+        indexes, version, _ = schema_state(db_path)
+        assert "idx_providers_name_npi" not in indexes
+        assert version == db.SCHEMA_VERSION
+
+    def test_newer_version_not_downgraded(self, db_path):
+        # Schema written by a newer release: its own index, no current ones
+        newer = ("CREATE INDEX idx_future ON care_plans(patient_mrn)",)
+        create_legacy_db(db_path, newer, db.SCHEMA_VERSION + 1)
+
+        db.init_db()
+
+        indexes, version, rows = schema_state(db_path)
+        assert indexes == {"idx_future"}
+        assert version == db.SCHEMA_VERSION + 1
+        assert rows == 1
+
+
+class TestDuplicateSignals:
+    """Tests for the day-bounded duplicate lookups."""
+
+    SUBMISSION = ("123456", "john", "DOE", "humira", "Dr. Smith", "1234567890")
+
+    @pytest.fixture(autouse=True)
+    def late_submission(self, db_path):
+        db.init_db()
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "INSERT INTO care_plans (patient_first_name, patient_last_name, referring_provider, "
+            "referring_provider_npi, patient_mrn, primary_diagnosis, medication_name, created_at) "
+            "VALUES ('John', 'Doe', 'Dr. Smith', '1234567890', '123456', 'E11.9', 'Humira', "
+            "'2024-05-01 23:59:59')"
+        )
+        conn.commit()
+        conn.close()
+
+    def test_same_day(self):
+        signals = db.collect_duplicate_signals(*self.SUBMISSION, date(2024, 5, 1))
+        assert signals["duplicate_hit"] is True
+        assert signals["previous_hit"] is False
+        assert db.find_duplicate_submission("john", "DOE", "123456", "humira", date(2024, 5, 1))
+
+    def test_next_day(self):
+        signals = db.collect_duplicate_signals(*self.SUBMISSION, date(2024, 5, 2))
+        assert signals["duplicate_hit"] is False
+        assert signals["previous_hit"] is True
+        assert db.find_previous_submission("123456", "humira", date(2024, 5, 2))
+
+    def test_batch_rows_keep_their_own_day(self):
+        signals = db.collect_duplicate_signals_many([
+            (*self.SUBMISSION, date(2024, 5, 2)),
+            (*self.SUBMISSION, date(2024, 5, 1)),
+        ])
+        assert [s["duplicate_hit"] for s in signals] == [False, True]
+
+
+class TestExportRows:
+    """Tests for the paged care plan export."""
+
+    @pytest.fixture(autouse=True)
+    def three_care_plans(self, db_path, monkeypatch):
+        # A single pooled connection makes any leaked checkout visible
+        monkeypatch.setattr(db, "POOL_SIZE", 1)
+        db.init_db()
+        for mrn in ("100001", "100002", "100003"):
+            db.insert_care_plan(("John", "Doe", "Dr. Smith", "1234567890", mrn, "E11.9", "Humira", "", "", ""), "[Plan]")
+
+    def test_pages_newest_first(self):
+        batches = list(db.iter_care_plan_rows(("patient_mrn",), batch_size=2))
+        assert batches == [[("100003",), ("100002",)], [("100001",)]]
+
+    def test_connection_returned_between_batches(self):
+        batches = db.iter_care_plan_rows(("patient_mrn",), batch_size=1)
+        assert next(batches) == [("100003",)]
+
+        # The paused download must not keep the only connection checked out
+        assert db._get_pool().qsize() == 1
+        assert db.find_provider_by_npi("1234567890") is None
+        assert [batch for batch in batches] == [[("100002",)], [("100001",)]]
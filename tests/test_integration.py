@@ -1,22 +1,30 @@
 """Integration tests using FastAPI TestClient."""
+import csv
+import io
+from pathlib import Path
 import pytest
-import os
 from unittest.mock import patch
 from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from pypdf import PdfWriter
 
-# Set up test database before importing app
-os.environ.setdefault("DATABASE_PATH", "test_careplan.db")
+import services
+from main import app, validate_request, _validate_fields
+import database
+from database import init_db, close_pool
 
-from main import app
-from database import init_db, DATABASE_PATH
+
+def remove_database():
+    """Delete the test database file (see conftest) and its WAL files."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{database.DATABASE_PATH}{suffix}").unlink(missing_ok=True)
 
 
 @pytest.fixture(scope="module")
 def client():
     """Create test client with fresh database and mocked LLM."""
-    # Remove test db if exists
-    if DATABASE_PATH.exists():
-        DATABASE_PATH.unlink()
+    close_pool()
+    remove_database()
     init_db()
     
     # Mock the LLM to avoid needing real API key in tests
@@ -25,8 +33,8 @@ def client():
             yield c
     
     # Cleanup
-    if DATABASE_PATH.exists():
-        DATABASE_PATH.unlink()
+    close_pool()
+    remove_database()
 
 
 class TestAPI:
@@ -114,6 +122,15 @@ class TestAPI:
         assert "text/csv" in response.headers["content-type"]
         assert "patient_first_name" in response.text
 
+    def test_export_streams_every_row(self, client):
+        with patch("main.EXPORT_BATCH_SIZE", 1):
+            response = client.get("/export")
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) >= 2
+        ids = [int(row["id"]) for row in rows]
+        assert ids == sorted(set(ids), reverse=True)  # every row once, newest first
+
     def test_exact_duplicate_same_day_blocked(self, client):
         # First submission
         response1 = client.post("/submit", data={
@@ -141,3 +158,111 @@ class TestAPI:
         data = response2.json()
         assert data["success"] is False
         assert "already submitted today" in data["errors"][0]
+
+    def test_duplicate_from_another_process_blocked_by_database(self, client, monkeypatch):
+        submission = {
+            "patient_first_name": "Database",
+            "patient_last_name": "Duplicate",
+            "referring_provider": "Dr. Test",
+            "referring_provider_npi": "1234567890",
+            "patient_mrn": "121212",
+            "primary_diagnosis": "E11.9",
+            "medication_name": "SameMed",
+        }
+        assert client.post("/submit", data=submission).status_code == 200
+        
+        # A fresh set, as in another worker: only the SQL check can catch it
+        monkeypatch.setattr(services, "_today_submissions", services.TodaySubmissions())
+        response = client.post("/submit", data={**submission, "patient_first_name": "DATABASE"})
+        assert response.status_code == 409
+        assert "already submitted today" in response.json()["errors"][0]
+
+    def test_provider_name_case_is_not_a_conflict(self, client):
+        response = client.post("/submit", data={
+            "patient_first_name": "Case",
+            "patient_last_name": "Provider",
+            "referring_provider": "DR. TEST",
+            "referring_provider_npi": "1234567890",
+            "patient_mrn": "888888",
+            "primary_diagnosis": "E11.9",
+            "medication_name": "TestMed",
+        })
+        assert response.status_code == 200
+
+    def test_provider_npi_conflict_blocked(self, client):
+        response = client.post("/submit", data={
+            "patient_first_name": "Conflict",
+            "patient_last_name": "Provider",
+            "referring_provider": "Dr. Other",
+            "referring_provider_npi": "1234567890",  # Registered to Dr. Test
+            "patient_mrn": "999999",
+            "primary_diagnosis": "E11.9",
+            "medication_name": "TestMed",
+        })
+        assert response.status_code == 409
+        assert "Dr. Test" in response.json()["errors"][0]
+
+    def test_upload_without_pdf_header_rejected(self, client):
+        response = client.post("/submit", data={
+            "patient_first_name": "Upload",
+            "patient_last_name": "Fake",
+            "referring_provider": "Dr. Test",
+            "referring_provider_npi": "1234567890",
+            "patient_mrn": "666666",
+            "primary_diagnosis": "E11.9",
+            "medication_name": "TestMed",
+        }, files={"patient_records_file": ("records.pdf", b"not really a pdf", "application/pdf")})
+        assert response.status_code == 400
+        assert "not a valid PDF" in response.json()["errors"][0]
+
+    def test_upload_pdf_accepted(self, client):
+        pdf = io.BytesIO()
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.write(pdf)
+
+        response = client.post("/submit", data={
+            "patient_first_name": "Upload",
+            "patient_last_name": "Real",
+            "referring_provider": "Dr. Test",
+            "referring_provider_npi": "1234567890",
+            "patient_mrn": "777777",
+            "primary_diagnosis": "E11.9",
+            "medication_name": "TestMed",
+        }, files={"patient_records_file": ("records.pdf", pdf.getvalue(), "application/pdf")})
+        assert response.status_code == 200
+        assert response.json()["success"] is True
+
+
+class TestValidateRequest:
+    """Tests for the memoized form validation."""
+
+    FIELDS = ("Cache", "Patient", "Dr. Test", "1234567890", "123123", "E11.9", "TestMed", "", "")
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        _validate_fields.cache_clear()
+        yield
+        _validate_fields.cache_clear()
+
+    def test_identical_fields_validated_once(self):
+        first = validate_request(*self.FIELDS, "")
+        second = validate_request(*self.FIELDS, "")
+        assert second is first
+        assert _validate_fields.cache_info().hits == 1
+
+    def test_patient_records_not_cached(self):
+        with_records = validate_request(*self.FIELDS, "Sensitive history")
+        without = validate_request(*self.FIELDS, "")
+        assert with_records.patient_records == "Sensitive history"
+        assert without.patient_records == ""
+        # The cached instance is the one returned without records
+        assert _validate_fields.cache_info().hits == 1
+
+    def test_validation_error_not_cached(self):
+        invalid = ("Cache", "Patient", "Dr. Test", "123", "123123", "E11.9", "TestMed", "", "")
+        for _ in range(2):
+            with pytest.raises(ValidationError):
+                validate_request(*invalid, "")
+        assert _validate_fields.cache_info().misses == 2
+        assert _validate_fields.cache_info().currsize == 0
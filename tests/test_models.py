@@ -19,6 +19,11 @@ class TestICD10Validation:
         assert is_valid_icd10("E1") is False
         assert is_valid_icd10("") is False
 
+    def test_icd10_must_match_whole_string(self):
+        assert is_valid_icd10("E11.9\n") is False
+        assert is_valid_icd10("E11.9X") is False
+        assert is_valid_icd10("E\u0661\u0661") is False  # non-ASCII digits
+
 
 class TestCarePlanRequest:
     """Tests for CarePlanRequest validation."""
@@ -40,6 +45,11 @@ class TestCarePlanRequest:
         assert request.patient_first_name == "John"
         assert request.primary_diagnosis == "E11.9"
 
+    def test_request_is_frozen(self, valid_data):
+        request = CarePlanRequest(**valid_data)
+        with pytest.raises(ValidationError):
+            request.patient_mrn = "654321"
+
     # NPI validation
     def test_npi_must_be_10_digits(self, valid_data):
         valid_data["referring_provider_npi"] = "123"
@@ -115,3 +125,13 @@ class TestCarePlanRequest:
         valid_data["medication_history"] = ""
         request = CarePlanRequest(**valid_data)
         assert request.medication_history == []
+
+    # Insert row
+    def test_as_insert_row_joins_lists(self, valid_data):
+        valid_data["additional_diagnoses"] = "I10, E78.5"
+        valid_data["medication_history"] = ["Metformin"]
+        row = CarePlanRequest(**valid_data).as_insert_row()
+        assert row == (
+            "John", "Doe", "Dr. Smith", "1234567890", "123456", "E11.9",
+            "Humira", "I10, E78.5", "Metformin", "",
+        )
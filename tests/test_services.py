@@ -1,12 +1,20 @@
 """Unit tests for business logic in services."""
+import asyncio
+from datetime import date
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, create_autospec
+import database
 from models import CarePlanRequest
-from services import check_duplicate_warnings, check_blocking_provider_conflict, ProviderConflictError
+from services import (
+    check_duplicate_warnings, check_blocking_provider_conflict, create_care_plan, vet_submission,
+    DuplicateSubmissionError, ProviderConflictError, TodaySubmissions, SignalBatcher,
+)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_request():
+    # Built once per module: CarePlanRequest is frozen, and tests that need
+    # a variant derive one with model_copy()
     return CarePlanRequest(
         patient_first_name="John",
         patient_last_name="Doe",
@@ -18,63 +26,267 @@ def sample_request():
     )
 
 
+def batched(signals):
+    """side_effect for collect_duplicate_signals_many: the same signals for every submission."""
+    return lambda submissions: [signals] * len(submissions)
+
+
+NO_CONFLICT = {
+    "conflicting_npi": None,
+    "conflicting_name": None,
+    "provider_registered": False,
+}
+
+NO_SIGNALS = {
+    "duplicate_hit": False,
+    "mrn_hit": False,
+    "name_hit": False,
+    "previous_hit": False,
+    **NO_CONFLICT,
+}
+
+
+# Built once per module and reset per test. Autospec checks every call against
+# the real database signatures, so a drifted call fails instead of passing.
+_DB_SPEC = create_autospec(database)
+
+
+@pytest.fixture(autouse=True)
+def mock_db(monkeypatch):
+    """services.db replaced by a mock that finds nothing; tests override what they need."""
+    db = _DB_SPEC
+    db.reset_mock(return_value=True, side_effect=True)
+    db.collect_duplicate_signals.return_value = NO_SIGNALS
+    db.collect_duplicate_signals_many.side_effect = batched(NO_SIGNALS)
+    db.find_provider_conflicts.return_value = NO_CONFLICT
+    db.find_duplicate_submission.return_value = None
+    monkeypatch.setattr("services.db", db)
+    return db
+
+
 class TestDuplicateWarnings:
     """Tests for duplicate detection logic."""
 
-    @patch("services.db")
-    def test_no_duplicates_returns_empty(self, mock_db, sample_request):
-        mock_db.find_care_plan_by_mrn.return_value = None
-        mock_db.find_care_plan_by_patient_name.return_value = None
-        mock_db.find_previous_submission.return_value = None
-
+    def test_no_duplicates_returns_empty(self, sample_request):
         warnings = check_duplicate_warnings(sample_request)
         assert warnings == []
 
-    @patch("services.db")
-    def test_duplicate_mrn_warns(self, mock_db, sample_request):
-        mock_db.find_care_plan_by_mrn.return_value = {"id": 1}
-        mock_db.find_previous_submission.return_value = None
+    @pytest.mark.parametrize("hits, expected", [
+        # MRN and name both match: only the MRN warning is shown
+        ({"mrn_hit": True, "name_hit": True}, "MRN"),
+        ({"name_hit": True}, "may already exist"),
+        ({"previous_hit": True}, "previous date"),
+    ], ids=["mrn", "name", "previous"])
+    def test_single_warning(self, mock_db, sample_request, hits, expected):
+        mock_db.collect_duplicate_signals.return_value = {**NO_SIGNALS, **hits}
 
         warnings = check_duplicate_warnings(sample_request)
         assert len(warnings) == 1
-        assert "MRN" in warnings[0]
+        assert expected.lower() in warnings[0].lower()
 
-    @patch("services.db")
-    def test_previous_submission_warns(self, mock_db, sample_request):
-        mock_db.find_care_plan_by_mrn.return_value = None
-        mock_db.find_care_plan_by_patient_name.return_value = None
-        mock_db.find_previous_submission.return_value = {"id": 1}
+    def test_uses_prefetched_signals(self, mock_db, sample_request):
+        signals = {"mrn_hit": False, "name_hit": True, "previous_hit": False}
 
-        warnings = check_duplicate_warnings(sample_request)
+        warnings = check_duplicate_warnings(sample_request, signals)
         assert len(warnings) == 1
-        assert "previous date" in warnings[0].lower()
+        assert "may already exist" in warnings[0]
+        mock_db.collect_duplicate_signals.assert_not_called()
 
 
 class TestProviderConflicts:
     """Tests for provider conflict blocking."""
 
-    @patch("services.db")
-    def test_no_conflict_passes(self, mock_db):
-        mock_db.find_provider_by_npi.return_value = None
-        mock_db.find_provider_by_name.return_value = None
-
+    def test_no_conflict_passes(self):
         # Should not raise
         check_blocking_provider_conflict("Dr. Smith", "1234567890")
 
-    @patch("services.db")
-    def test_npi_with_different_name_raises(self, mock_db):
-        mock_db.find_provider_by_name.return_value = None
-        mock_db.find_provider_by_npi.return_value = {"name": "Dr. Jones", "npi": "1234567890"}
+    @pytest.mark.parametrize("conflict, expected", [
+        ({"conflicting_name": "Dr. Jones", "provider_registered": True}, "Dr. Jones"),
+        ({"conflicting_npi": "9999999999"}, "9999999999"),
+    ], ids=["npi_with_different_name", "name_with_different_npi"])
+    def test_conflict_raises(self, mock_db, conflict, expected):
+        mock_db.find_provider_conflicts.return_value = {**NO_CONFLICT, **conflict}
 
         with pytest.raises(ProviderConflictError) as exc:
             check_blocking_provider_conflict("Dr. Smith", "1234567890")
-        assert "Dr. Jones" in str(exc.value)
+        assert expected in str(exc.value)
 
-    @patch("services.db")
-    def test_name_with_different_npi_raises(self, mock_db):
-        mock_db.find_provider_by_npi.return_value = None
-        mock_db.find_provider_by_name.return_value = {"name": "Dr. Smith", "npi": "9999999999"}
 
-        with pytest.raises(ProviderConflictError) as exc:
-            check_blocking_provider_conflict("Dr. Smith", "1234567890")
-        assert "9999999999" in str(exc.value)
+class TestTodaySubmissions:
+    """Tests for the in-process same-day duplicate keys."""
+
+    def test_key_folds_ascii_case_like_nocase(self, sample_request):
+        upper = sample_request.model_copy(update={"patient_first_name": "JOHN", "medication_name": "HUMIRA"})
+        accented = sample_request.model_copy(update={"patient_first_name": "\u00c9lan"})
+        lower = sample_request.model_copy(update={"patient_first_name": "\u00e9lan"})
+
+        assert TodaySubmissions.key(upper) == TodaySubmissions.key(sample_request)
+        # SQLite NOCASE leaves non-ASCII letters alone
+        assert TodaySubmissions.key(accented) != TodaySubmissions.key(lower)
+
+    def test_earlier_day_not_recorded(self, sample_request):
+        today = TodaySubmissions()
+        key = TodaySubmissions.key(sample_request)
+        today.add(key, date(2000, 1, 1))
+        assert key not in today
+
+
+class TestCreateCarePlan:
+    """Tests for the create_care_plan orchestration."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_today_submissions(self, monkeypatch):
+        monkeypatch.setattr("services._today_submissions", TodaySubmissions())
+
+    @patch("services.generate_care_plan")
+    def test_generates_and_saves(self, mock_generate, mock_db, sample_request):
+        mock_db.insert_care_plan_with_provider.return_value = 7
+        mock_generate.return_value = "[Plan]"
+
+        result = asyncio.run(create_care_plan(sample_request))
+        assert result.id == 7
+        assert result.generated_plan == "[Plan]"
+        assert result.warnings == []
+        mock_db.insert_care_plan_with_provider.assert_called_once()
+        mock_db.insert_care_plan.assert_not_called()
+
+    @patch("services.generate_care_plan")
+    def test_known_provider_not_reinserted(self, mock_generate, mock_db, sample_request):
+        mock_db.collect_duplicate_signals_many.side_effect = batched({**NO_SIGNALS, "provider_registered": True})
+        mock_generate.return_value = "[Plan]"
+
+        asyncio.run(create_care_plan(sample_request))
+        mock_db.insert_care_plan_with_provider.assert_not_called()
+        mock_db.insert_care_plan.assert_called_once()
+
+    @patch("services.generate_care_plan")
+    def test_duplicate_skips_generation(self, mock_generate, mock_db, sample_request):
+        mock_db.collect_duplicate_signals_many.side_effect = batched({
+            **NO_SIGNALS,
+            "duplicate_hit": True,
+            "mrn_hit": True,
+            "name_hit": True,
+            "provider_registered": True,
+        })
+
+        with pytest.raises(DuplicateSubmissionError):
+            asyncio.run(create_care_plan(sample_request))
+        mock_generate.assert_not_called()
+        mock_db.insert_care_plan.assert_not_called()
+        mock_db.insert_care_plan_with_provider.assert_not_called()
+
+    @patch("services.generate_care_plan")
+    def test_repeat_in_same_process_blocked_without_query(self, mock_generate, mock_db, sample_request):
+        mock_generate.return_value = "[Plan]"
+        asyncio.run(create_care_plan(sample_request))
+        mock_db.reset_mock()
+
+        repeat = sample_request.model_copy(update={"patient_first_name": "JOHN"})
+        with pytest.raises(DuplicateSubmissionError):
+            asyncio.run(create_care_plan(repeat))
+        mock_db.collect_duplicate_signals_many.assert_not_called()
+
+
+class TestAgainstDatabase:
+    """Tests running the services checks against a real SQLite database."""
+
+    @pytest.fixture(autouse=True)
+    def real_db(self, tmp_path, monkeypatch):
+        # A fresh file per test, so concurrent writers get real file locking
+        # and the busy timeout
+        database.close_pool()
+        monkeypatch.setattr(database, "DATABASE_PATH", tmp_path / "careplan.db")
+        database.init_db()
+        monkeypatch.setattr("services.db", database)
+        monkeypatch.setattr("services._today_submissions", TodaySubmissions())
+        yield
+        database.close_pool()
+
+    @staticmethod
+    def save(data):
+        database.insert_care_plan_with_provider(
+            data.as_insert_row(), "[Plan]", data.referring_provider, data.referring_provider_npi
+        )
+
+    def test_empty_database_passes(self, sample_request):
+        check = vet_submission(sample_request)
+        assert check.warnings == []
+        assert check.provider_exists is False
+
+    def test_same_mrn_warns(self, sample_request):
+        self.save(sample_request)
+
+        other = sample_request.model_copy(update={"patient_first_name": "Jane", "medication_name": "Enbrel"})
+        check = vet_submission(other)
+        assert len(check.warnings) == 1
+        assert "MRN" in check.warnings[0]
+        assert check.provider_exists is True
+
+    def test_same_day_duplicate_blocked(self, sample_request):
+        self.save(sample_request)
+
+        with pytest.raises(DuplicateSubmissionError):
+            vet_submission(sample_request.model_copy(update={"patient_last_name": "DOE"}))
+
+    def test_provider_conflict_blocked(self, sample_request):
+        self.save(sample_request)
+
+        other = sample_request.model_copy(update={"patient_mrn": "654321", "referring_provider": "Dr. Jones"})
+        with pytest.raises(ProviderConflictError):
+            vet_submission(other)
+
+    @patch("services.generate_care_plan")
+    def test_concurrent_submissions_saved(self, mock_generate, sample_request):
+        mock_generate.return_value = "[Plan]"
+        second = sample_request.model_copy(update={"patient_mrn": "654321", "patient_first_name": "Jane"})
+
+        async def submit_both():
+            return await asyncio.gather(create_care_plan(sample_request), create_care_plan(second))
+
+        first_result, second_result = asyncio.run(submit_both())
+        assert first_result.id != second_result.id
+        assert database.find_care_plan_by_mrn("654321")["id"] == second_result.id
+
+
+class TestSignalBatcher:
+    """Tests for coalescing concurrent duplicate-signal lookups."""
+
+    @staticmethod
+    def collect_all(batcher, requests):
+        async def run():
+            return await asyncio.gather(
+                *(batcher.collect(r, date(2024, 5, 1)) for r in requests), return_exceptions=True
+            )
+        return asyncio.run(run())
+
+    def test_concurrent_lookups_share_one_query(self, mock_db, sample_request):
+        mock_db.collect_duplicate_signals_many.side_effect = lambda submissions: [
+            {**NO_SIGNALS, "mrn_hit": mrn == "2"} for mrn, *_ in submissions
+        ]
+        requests = [
+            sample_request.model_copy(update={"patient_mrn": mrn}) for mrn in ("1", "2", "3")
+        ]
+
+        results = self.collect_all(SignalBatcher(), requests)
+        assert [r["mrn_hit"] for r in results] == [False, True, False]
+        mock_db.collect_duplicate_signals_many.assert_called_once()
+        (submissions,), _ = mock_db.collect_duplicate_signals_many.call_args
+        assert [s[0] for s in submissions] == ["1", "2", "3"]
+
+    def test_batches_capped_at_max_batch(self, mock_db, sample_request):
+        results = self.collect_all(SignalBatcher(max_batch=2), [sample_request] * 5)
+        assert results == [NO_SIGNALS] * 5
+        sizes = [len(c.args[0]) for c in mock_db.collect_duplicate_signals_many.call_args_list]
+        assert sizes == [2, 2, 1]
+
+    def test_query_error_fails_every_caller(self, mock_db, sample_request):
+        mock_db.collect_duplicate_signals_many.side_effect = RuntimeError("database is locked")
+
+        results = self.collect_all(SignalBatcher(), [sample_request] * 3)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_short_result_fails_instead_of_hanging(self, mock_db, sample_request):
+        mock_db.collect_duplicate_signals_many.side_effect = lambda submissions: [NO_SIGNALS]
+
+        results = self.collect_all(SignalBatcher(), [sample_request] * 2)
+        assert all(isinstance(r, RuntimeError) for r in results)